@@ -5,7 +5,12 @@ import os
 import time
 import asyncio
 import contextlib
+import random
 import re
+from collections import OrderedDict, deque
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
 from html import escape
 
 from telegram import (
@@ -13,8 +18,9 @@ from telegram import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
     ChatPermissions,
+    LabeledPrice,
 )
-from telegram.error import RetryAfter, Forbidden, BadRequest, ChatMigrated
+from telegram.error import RetryAfter, Forbidden, BadRequest, ChatMigrated, TimedOut, NetworkError, TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -24,15 +30,19 @@ from telegram.ext import (
     filters,
     ChatMemberHandler,
     PreCheckoutQueryHandler,
+    Job,
 )
 
-from psycopg_pool import ConnectionPool  # ✅ ONLY THIS (Supabase safe)
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool  # ✅ ONLY THIS (Supabase safe)
 
 # ===============================
 # CONFIG / CONSTANTS
 # ===============================
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 OWNER_ID = int(os.getenv("OWNER_ID", "0"))
+TON_ADDRESS = os.getenv("TON_ADDRESS", "PUT_YOUR_TON_ADDRESS_HERE")
 START_IMAGE = "https://i.postimg.cc/fRxRYj9Y/photo_2026_02_10_01_15_39.jpg"
 
 DB_HOST = os.getenv("SUPABASE_HOST")
@@ -41,25 +51,73 @@ DB_USER = os.getenv("SUPABASE_USER")
 DB_PASS = os.getenv("SUPABASE_PASSWORD")
 DB_PORT = int(os.getenv("SUPABASE_PORT", "6543"))
 
+# ChatMember statuses that count as admin (hashed lookup, built once)
+ADMIN_STATUSES = frozenset(("administrator", "creator"))
+
 # Forward + mute
 FORWARD_LIMIT = 3
 MUTE_SECONDS = 600
 SPAM_RESET_SECONDS = 3600
 
+# Telegram allows ~30 msg/s bot-wide; stay just under it
+SEND_RATE = 28
+SEND_RATE_PERIOD = 1.0
+BROADCAST_CONCURRENCY = 20  # sends in flight; SEND_LIMITER still caps the rate
+# ...and ~20 msg/min into any single group
+GROUP_SEND_RATE = 20
+GROUP_SEND_PERIOD = 60.0
+# attempts per broadcast target (429 waits + transient network errors)
+SEND_MAX_ATTEMPTS = 5
+SEND_BACKOFF_MAX = 8.0  # seconds, before jitter
+
+# updates handled in parallel (a slow chat / long broadcast must not stall the rest)
+UPDATE_CONCURRENCY = 64
+
+# parallel get_chat_member probes for /refresh_all + startup admin refresh
+REFRESH_CONCURRENCY = 10
+
+# broadcast progress message is edited at most this often (seconds)
+PROGRESS_EDIT_INTERVAL = 2.0
+# dead broadcast targets are deleted once this many have piled up (and at the end)
+DEAD_FLUSH_SIZE = 500
+
+# write-behind DB queue (see queue_db_write)
+DB_WRITE_QUEUE_MAX = 10_000
+DB_WRITE_BATCH = 100
+USER_FLUSH_INTERVAL = 1.0  # seconds between batched users INSERTs
+
 # ===============================
 # GLOBAL CACHES / STATE
 # ===============================
 STATS_CACHE = {"users": 0, "groups": 0, "admin_groups": 0, "last_update": 0}
 STATS_TTL = 300  # 5 minutes
+STATS_LOCK = asyncio.Lock()
 
 BOT_ADMIN_CACHE: set[int] = set()
-USER_ADMIN_CACHE: dict[int, set[int]] = {}
+# what the groups row says, not what Telegram says: chat_id -> ts of the last
+# is_admin_cached=TRUE write (any FALSE write drops the entry)
+DB_ADMIN_TRUE: dict[int, int] = {}
+DB_ADMIN_REWRITE_SECONDS = 600  # re-assert TRUE this often (heals dropped writes)
+NON_ADMIN_START_CACHE: dict[int, tuple[bool, float]] = {}  # chat_id -> (can_send, expires_at)
+NON_ADMIN_START_TTL = 30  # group /start re-probes a non-admin chat at most this often
+USER_ADMIN_CACHE: OrderedDict[int, tuple[set[int], float]] = OrderedDict()  # chat_id -> (admin ids, expires_at), LRU order
+USER_ADMIN_CACHE_MAX = 10_000  # hard cap, least recently used chats evicted first
+USER_ADMIN_TTL = 600  # 10 minutes (invalidated on my_chat_member + /refresh)
+USER_ADMIN_RETRY_SECONDS = 30  # failed lookups are not retried on every message
 REMINDER_MESSAGES: dict[int, list[int]] = {}
-PENDING_BROADCAST = {}
+REMINDER_TOTAL = 5  # admin reminders sent before auto-leave
+REMINDER_INTERVAL = 300  # 5 minutes between reminders
+AUTO_LEAVE_GRACE = 10  # seconds after the last reminder
+PENDING_USERS: set[int] = set()  # /start users not yet written (deduped, flushed in one INSERT)
+CHAT_JOBS: dict[int, list[Job]] = {}  # chat_id -> pending reminder / auto-leave jobs
+PENDING_BROADCAST: dict[int, tuple[dict, float]] = {}  # owner_id -> (content, expires_at)
+PENDING_BROADCAST_TTL = 300  # unconfirmed broadcasts expire after 5 minutes
 BOT_START_TIME = int(time.time())
 
-FORWARD_SPAM_CACHE = {}
+# (chat_id, user_id) -> (count, last_time, mute_until); LRU order, RAM only
+FORWARD_SPAM_CACHE: OrderedDict[tuple[int, int], tuple[int, int, int]] = OrderedDict()
 FORWARD_SPAM_CACHE_TTL = 7200  # 2 hours
+FORWARD_SPAM_CACHE_MAX = 50_000
 
 LOG_RATE_CACHE = {}
 LOG_RATE_SECONDS = 60
@@ -70,33 +128,30 @@ ADMIN_VERIFY_SECONDS = 60
 RECENT_WARN_CACHE = {}
 RECENT_WARN_SECONDS = 5
 
-ADMIN_LIST_CACHE: dict[int, set[int]] = {}
-ADMIN_LIST_CACHE_TS: dict[int, int] = {}
-ADMIN_LIST_TTL = 60  # seconds
-
 BOT_RESTRICT_CACHE: dict[int, tuple[bool, int]] = {}  # chat_id -> (can_restrict, ts)
 BOT_RESTRICT_TTL = 300  # 5 minutes
 
+GROUP_SEND_LIMITERS: dict[int, "RateLimiter"] = {}  # chat_id -> per-group warn budget
+
 # ===============================
 # DB POOL + DB EXEC
 # ===============================
 pool = None
 
 async def db_execute(query, params=None, fetch=False):
-    loop = asyncio.get_running_loop()
-
-    def _run():
-        if pool is None:
-            raise RuntimeError("DB pool not initialized")
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                if fetch:
-                    cols = [d.name for d in cur.description]
-                    return [dict(zip(cols, r)) for r in cur.fetchall()]
-                conn.commit()
-
-    return await loop.run_in_executor(None, _run)
+    # async pool: the event loop owns the sockets, no worker-thread hop per query
+    if pool is None:
+        raise RuntimeError("DB pool not initialized")
+    async with pool.connection() as conn:
+        if fetch == "column":
+            # single-column fast path: flat list, no per-row dict
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return [r[0] for r in await cur.fetchall()]
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(query, params)
+            if fetch:
+                return await cur.fetchall()
 
 # ✅ prevent "Task exception was never retrieved" when DB is down
 async def safe_db_execute(query, params=None, fetch=False):
@@ -107,42 +162,101 @@ async def safe_db_execute(query, params=None, fetch=False):
         rate_limited_log("db_error", f"❌ DB ERROR: {e}")
         return None
 
+# ✅ write-behind: fire-and-forget writes go through one queue, drained by a
+# single worker in pipelined batches (one connection checkout per batch)
+DB_WRITE_QUEUE: asyncio.Queue[tuple[str, tuple | None]] = asyncio.Queue(DB_WRITE_QUEUE_MAX)
+
+def queue_db_write(query, params=None):
+    try:
+        DB_WRITE_QUEUE.put_nowait((query, params))
+    except asyncio.QueueFull:
+        rate_limited_log("db_write_queue_full", "⚠️ DB write queue full: write dropped")
+
+async def db_write_worker():
+    while True:
+        batch = [await DB_WRITE_QUEUE.get()]
+        while len(batch) < DB_WRITE_BATCH and not DB_WRITE_QUEUE.empty():
+            batch.append(DB_WRITE_QUEUE.get_nowait())
+        try:
+            if pool is None:
+                raise RuntimeError("DB pool not initialized")
+            async with pool.connection() as conn:
+                # pipeline mode: send the whole batch, then read the results
+                async with conn.pipeline(), conn.cursor() as cur:
+                    # consecutive writes with the same SQL go out as one executemany
+                    for query, group in groupby(batch, key=itemgetter(0)):
+                        # ✅ own transaction per SQL group: a failing write only
+                        # rolls back itself, never its neighbours in the batch
+                        try:
+                            async with conn.transaction():
+                                await cur.executemany(query, [params for _, params in group])
+                        except psycopg.Error as e:
+                            rate_limited_log("db_error", f"❌ DB ERROR: {e}")
+        except Exception as e:
+            rate_limited_log("db_error", f"❌ DB ERROR: {e}")
+        finally:
+            for _ in batch:
+                DB_WRITE_QUEUE.task_done()
+
 
 # ===============================
 # DB INIT / DB HELPERS
 # ===============================
 async def init_db():
+    # one round-trip (and one transaction) for the whole idempotent schema
     await db_execute("""
         CREATE TABLE IF NOT EXISTS users (
             user_id BIGINT PRIMARY KEY
-        )
-    """)
-    await db_execute("""
+        );
         CREATE TABLE IF NOT EXISTS groups (
             group_id BIGINT PRIMARY KEY,
             is_admin_cached BOOLEAN DEFAULT FALSE,
             last_checked_at BIGINT
-        )
-    """)
-    await db_execute("""
+        );
         CREATE TABLE IF NOT EXISTS forward_spam (
             chat_id BIGINT,
             user_id BIGINT,
             count INT,
             last_time BIGINT,
             PRIMARY KEY (chat_id, user_id)
-        )
+        );
+        -- broadcast / stats / startup refresh all filter on is_admin_cached
+        CREATE INDEX IF NOT EXISTS groups_admin_cached_idx
+        ON groups (group_id) WHERE is_admin_cached;
     """)
 
-async def upsert_forward_spam(chat_id: int, user_id: int, count: int, last_time: int):
-    await safe_db_execute(
-        """
-        INSERT INTO forward_spam (chat_id, user_id, count, last_time)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (chat_id, user_id)
-        DO UPDATE SET count = EXCLUDED.count, last_time = EXCLUDED.last_time
-        """,
-        (chat_id, user_id, count, last_time)
+UPSERT_GROUP_SQL = """
+    INSERT INTO groups (group_id, is_admin_cached, last_checked_at)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (group_id)
+    DO UPDATE SET
+      is_admin_cached = EXCLUDED.is_admin_cached,
+      last_checked_at = EXCLUDED.last_checked_at
+"""
+
+def track_db_admin(chat_id: int, is_admin: bool, checked_at: int):
+    if is_admin:
+        DB_ADMIN_TRUE[chat_id] = checked_at
+    else:
+        DB_ADMIN_TRUE.pop(chat_id, None)
+
+async def upsert_group(chat_id: int, is_admin: bool, checked_at: int):
+    track_db_admin(chat_id, is_admin, checked_at)
+    await safe_db_execute(UPSERT_GROUP_SQL, (chat_id, is_admin, checked_at))
+
+def queue_group_upsert(chat_id: int, is_admin: bool, checked_at: int):
+    track_db_admin(chat_id, is_admin, checked_at)
+    queue_db_write(UPSERT_GROUP_SQL, (chat_id, is_admin, checked_at))
+
+async def flush_pending_users(context: ContextTypes.DEFAULT_TYPE = None):
+    # ✅ one multi-row INSERT for every /start user seen since the last flush
+    if not PENDING_USERS:
+        return
+    ids = list(PENDING_USERS)
+    PENDING_USERS.clear()
+    queue_db_write(
+        "INSERT INTO users SELECT unnest(%s::bigint[]) ON CONFLICT DO NOTHING",
+        (ids,)
     )
 
 async def is_group_admin_cached_db(chat_id: int) -> bool:
@@ -156,6 +270,12 @@ async def is_group_admin_cached_db(chat_id: int) -> bool:
 # ===============================
 # GENERIC HELPERS
 # ===============================
+# Telegram HTML text nodes only need &, < and > escaped: one C-level pass
+HTML_TEXT_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+def escape_text(text: str) -> str:
+    return text.translate(HTML_TEXT_ESCAPE)
+
 def rate_limited_log(key: str, message: str):
     now = int(time.time())
     last = LOG_RATE_CACHE.get(key, 0)
@@ -163,6 +283,52 @@ def rate_limited_log(key: str, message: str):
         LOG_RATE_CACHE[key] = now
         print(message)
 
+class RateLimiter:
+    """Sliding-window limiter: at most `rate` acquisitions per `per` seconds."""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self.events: deque[float] = deque()
+        self.blocked_until = 0.0
+
+    def backoff(self, seconds: float):
+        # a 429 applies to the whole bot, so hold every sender, not just the one that hit it
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            while self.events and now - self.events[0] >= self.per:
+                self.events.popleft()
+            if len(self.events) < self.rate:
+                self.events.append(now)
+                return
+            await asyncio.sleep(self.per - (now - self.events[0]))
+
+    def try_acquire(self) -> bool:
+        # non-blocking variant: for sends that are better dropped than delayed
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return False
+        while self.events and now - self.events[0] >= self.per:
+            self.events.popleft()
+        if len(self.events) < self.rate:
+            self.events.append(now)
+            return True
+        return False
+
+SEND_LIMITER = RateLimiter(SEND_RATE, SEND_RATE_PERIOD)
+
+def group_send_allowed(chat_id: int) -> bool:
+    limiter = GROUP_SEND_LIMITERS.get(chat_id)
+    if limiter is None:
+        limiter = GROUP_SEND_LIMITERS[chat_id] = RateLimiter(GROUP_SEND_RATE, GROUP_SEND_PERIOD)
+    return limiter.try_acquire()
+
 def is_forwarded_message(msg) -> bool:
     """Return True if message is forwarded (supports new/old Telegram fields)."""
     if not msg:
@@ -170,67 +336,140 @@ def is_forwarded_message(msg) -> bool:
     # PTB v20+ / Telegram newer
     if getattr(msg, "forward_origin", None) is not None:
         return True
-    # older fields
-    if getattr(msg, "forward_date", None) is not None:
-        return True
-    if getattr(msg, "forward_from", None) is not None:
-        return True
-    if getattr(msg, "forward_from_chat", None) is not None:
-        return True
-    return False
+    # older fields: forward_date is set on every forward (forward_from /
+    # forward_from_chat are only set alongside it), so one check is enough
+    return getattr(msg, "forward_date", None) is not None
+
+def schedule_chat_job(job_queue, callback, when, data: dict, name: str) -> Job:
+    # ✅ per-chat index so clear_reminders never scans the whole job queue
+    job = job_queue.run_once(callback, when=when, data=data, name=name)
+    CHAT_JOBS.setdefault(data["chat_id"], []).append(job)
+    return job
+
+def has_pending_chat_job(chat_id: int, name: str) -> bool:
+    return any(job.name == name for job in CHAT_JOBS.get(chat_id, ()))
 
 def clear_reminders(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
-    job_queue = context.job_queue
-    if job_queue is None:
-        return
-    for job in list(job_queue.jobs()):
-        data = job.data or {}
-        if data.get("chat_id") != chat_id:
+    for job in CHAT_JOBS.pop(chat_id, ()):
+        if job.removed:
             continue
-        name = job.name or ""
-        if name.startswith("auto_leave_") or data.get("type") == "admin_reminder":
+        # jobs that already ran are gone from the scheduler
+        with contextlib.suppress(Exception):
             job.schedule_removal()
 
 async def cleanup_forward_spam_cache(context: ContextTypes.DEFAULT_TYPE):
     now = int(time.time())
     removed = 0
-    for key, data in list(FORWARD_SPAM_CACHE.items()):
-        if now - data["last_time"] > FORWARD_SPAM_CACHE_TTL:
-            FORWARD_SPAM_CACHE.pop(key, None)
-            removed += 1
+    cutoff = now - FORWARD_SPAM_CACHE_TTL
+    # oldest entries are at the front: stop at the first live one, O(expired)
+    while FORWARD_SPAM_CACHE:
+        _, last_time, _ = next(iter(FORWARD_SPAM_CACHE.values()))
+        if last_time >= cutoff:
+            break
+        FORWARD_SPAM_CACHE.popitem(last=False)
+        removed += 1
     if removed:
         print(f"🧹 RAM cache cleaned: {removed} entries")
 
-# pagination helper (OFFSET version) - from your pasted code
-async def iter_db_ids(query, batch_size=500):
-    offset = 0
-    while True:
-        rows = await safe_db_execute(
-            f"{query} LIMIT %s OFFSET %s",
-            (batch_size, offset),
-            fetch=True
-        )
+def get_pending_broadcast(pop: bool = False):
+    entry = PENDING_BROADCAST.pop(OWNER_ID, None) if pop else PENDING_BROADCAST.get(OWNER_ID)
+    if not entry:
+        return None
+    content, expires_at = entry
+    if time.monotonic() >= expires_at:
+        PENDING_BROADCAST.pop(OWNER_ID, None)
+        return None
+    return content
+
+async def cleanup_state_caches(context: ContextTypes.DEFAULT_TYPE):
+    # ✅ short-lived throttle caches only need their live window; drop the rest
+    now = int(time.time())
+    mono = time.monotonic()
+    removed = 0
+    for cache, window in (
+        (LOG_RATE_CACHE, LOG_RATE_SECONDS),
+        (ADMIN_VERIFY_CACHE, ADMIN_VERIFY_SECONDS),
+        (RECENT_WARN_CACHE, RECENT_WARN_SECONDS),
+    ):
+        cutoff = now - window
+        for key, ts in list(cache.items()):
+            if ts <= cutoff:
+                cache.pop(key, None)
+                removed += 1
+    cutoff = now - DB_ADMIN_REWRITE_SECONDS
+    for key, ts in list(DB_ADMIN_TRUE.items()):
+        if ts <= cutoff:
+            DB_ADMIN_TRUE.pop(key, None)
+            removed += 1
+    cutoff = now - BOT_RESTRICT_TTL
+    for key, (_, ts) in list(BOT_RESTRICT_CACHE.items()):
+        if ts <= cutoff:
+            BOT_RESTRICT_CACHE.pop(key, None)
+            removed += 1
+    for key, limiter in list(GROUP_SEND_LIMITERS.items()):
+        if not limiter.events or mono - limiter.events[-1] >= limiter.per:
+            GROUP_SEND_LIMITERS.pop(key, None)
+            removed += 1
+    for key, (_, expires_at) in list(NON_ADMIN_START_CACHE.items()):
+        if mono >= expires_at:
+            NON_ADMIN_START_CACHE.pop(key, None)
+            removed += 1
+    for key, (_, expires_at) in list(USER_ADMIN_CACHE.items()):
+        if mono >= expires_at:
+            USER_ADMIN_CACHE.pop(key, None)
+            removed += 1
+    for key, (_, expires_at) in list(PENDING_BROADCAST.items()):
+        if mono >= expires_at:
+            PENDING_BROADCAST.pop(key, None)
+            removed += 1
+    if removed:
+        print(f"🧹 State caches cleaned: {removed} entries")
+
+# pagination helper (keyset version): each page is an index range scan on the PK,
+# and rows deleted mid-iteration can't shift later pages (unlike OFFSET)
+async def iter_db_ids(table, column, where="TRUE", batch_size=500):
+    def fetch_page(after):
+        if after is None:
+            query = f"SELECT {column} FROM {table} WHERE {where} ORDER BY {column} LIMIT %s"
+            params = (batch_size,)
+        else:
+            query = (
+                f"SELECT {column} FROM {table} WHERE {where} AND {column} > %s "
+                f"ORDER BY {column} LIMIT %s"
+            )
+            params = (after, batch_size)
+        return asyncio.ensure_future(safe_db_execute(query, params, fetch="column"))
+
+    pending = fetch_page(None)
+    while pending is not None:
+        rows = await pending
         if rows is None:
             break
         if not rows:
             break
+        # prefetch the next page while the caller sends this one;
+        # a short page is the last one, so skip the empty round-trip
+        pending = fetch_page(rows[-1]) if len(rows) == batch_size else None
         yield rows
-        offset += batch_size
 
-async def update_progress(msg, sent, total):
+def progress_percent(sent, total) -> int:
     if total <= 0:
-        percent = 100
-    else:
-        percent = int((sent / total) * 100)
-    bar_blocks = min(10, percent // 10)
-    bar = "█" * bar_blocks + "░" * (10 - bar_blocks)
+        return 100
+    return sent * 100 // total
+
+# the 11 possible bars, built once
+PROGRESS_BARS = tuple("█" * i + "░" * (10 - i) for i in range(11))
+
+async def update_progress(msg, sent, total):
+    percent = progress_percent(sent, total)
+    bar = PROGRESS_BARS[min(10, percent // 10)]
     try:
         await msg.edit_text(
             "📢 <b>Broadcasting...</b>\n\n"
             f"⏳ Progress: {bar} {percent}%",
             parse_mode="HTML"
         )
-    except:
+    except TelegramError:
         pass
 
 # ===============================
@@ -241,11 +480,11 @@ async def is_bot_admin(chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool
         return True
     try:
         me = await context.bot.get_chat_member(chat_id, context.bot.id)
-        if me.status in ("administrator", "creator"):
+        if me.status in ADMIN_STATUSES:
             BOT_ADMIN_CACHE.add(chat_id)
             return True
         return False
-    except:
+    except TelegramError:
         return False
 
 async def ensure_bot_admin_live(chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
@@ -268,7 +507,7 @@ async def ensure_bot_admin_live(chat_id: int, context: ContextTypes.DEFAULT_TYPE
         if chat_id in BOT_ADMIN_CACHE:
             BOT_ADMIN_CACHE.discard(chat_id)
             BOT_ADMIN_CACHE.add(new_id)
-        USER_ADMIN_CACHE[new_id] = USER_ADMIN_CACHE.pop(chat_id, set())
+        USER_ADMIN_CACHE.pop(chat_id, None)
         REMINDER_MESSAGES[new_id] = REMINDER_MESSAGES.pop(chat_id, [])
 
         # migrate FORWARD_SPAM_CACHE keys (chat_id, user_id)
@@ -279,29 +518,13 @@ async def ensure_bot_admin_live(chat_id: int, context: ContextTypes.DEFAULT_TYPE
 
         # -------- DB migrate --------
         # ✅ IMPORTANT: UPSERT new row + remove old row (avoid stale rows)
-        context.application.create_task(
-            safe_db_execute(
-                """
-                INSERT INTO groups (group_id, is_admin_cached, last_checked_at)
-                VALUES (%s, TRUE, %s)
-                ON CONFLICT (group_id)
-                DO UPDATE SET
-                  is_admin_cached = TRUE,
-                  last_checked_at = EXCLUDED.last_checked_at
-                """,
-                (new_id, now)
-            )
-        )
-        context.application.create_task(
-            safe_db_execute("DELETE FROM groups WHERE group_id=%s", (chat_id,))
-        )
-        context.application.create_task(
-            safe_db_execute("DELETE FROM forward_spam WHERE chat_id=%s", (chat_id,))
-        )
+        queue_group_upsert(new_id, True, now)
+        queue_db_write("DELETE FROM groups WHERE group_id=%s", (chat_id,))
+        queue_db_write("DELETE FROM forward_spam WHERE chat_id=%s", (chat_id,))
 
         # retry with new chat_id
         return await ensure_bot_admin_live(new_id, context)
-    except Exception:
+    except TelegramError:
         ADMIN_VERIFY_CACHE.pop(chat_id, None)                        
         # cannot access -> treat as removed / no admin
         BOT_ADMIN_CACHE.discard(chat_id)
@@ -309,46 +532,30 @@ async def ensure_bot_admin_live(chat_id: int, context: ContextTypes.DEFAULT_TYPE
         REMINDER_MESSAGES.pop(chat_id, None)
         return False
 
-    is_admin = me.status in ("administrator", "creator")
+    is_admin = me.status in ADMIN_STATUSES
     can_delete = getattr(me, "can_delete_messages", False)
+    # ✅ same ChatMember answers the mute-permission question: forward_spam_control
+    # reuses it instead of probing get_chat_member again
+    BOT_RESTRICT_CACHE[chat_id] = (bool(getattr(me, "can_restrict_members", False)), now)
     if is_admin and can_delete:
         BOT_ADMIN_CACHE.add(chat_id)
-        # ✅ keep DB in-sync (support-only) so broadcast/stats stay correct
-        context.application.create_task(
-            safe_db_execute(
-                """
-                INSERT INTO groups (group_id, is_admin_cached, last_checked_at)
-                VALUES (%s, TRUE, %s)
-                ON CONFLICT (group_id)
-                DO UPDATE SET
-                  is_admin_cached = TRUE,
-                  last_checked_at = EXCLUDED.last_checked_at
-                """,
-                (chat_id, now)
-            )
-        )
+        # ✅ keep DB in-sync (support-only) so broadcast/stats stay correct;
+        # skip the write only while the row is known to say TRUE, and re-assert
+        # it now and then in case a queued write was dropped
+        if now - DB_ADMIN_TRUE.get(chat_id, 0) >= DB_ADMIN_REWRITE_SECONDS:
+            queue_group_upsert(chat_id, True, now)
         return True
 
     BOT_ADMIN_CACHE.discard(chat_id)
     USER_ADMIN_CACHE.pop(chat_id, None)
     REMINDER_MESSAGES.pop(chat_id, None)
 
-    context.application.create_task(
-        safe_db_execute(
-            """
-            INSERT INTO groups (group_id, is_admin_cached, last_checked_at)
-            VALUES (%s, FALSE, %s)
-            ON CONFLICT (group_id)
-            DO UPDATE SET
-              is_admin_cached = FALSE,
-              last_checked_at = EXCLUDED.last_checked_at
-            """,
-            (chat_id, now)
-        )
-    )
+    queue_group_upsert(chat_id, False, now)
 
-    if context.job_queue:
-        context.job_queue.run_once(
+    # ✅ one pending leave job per chat: forwards keep arriving while it waits
+    if context.job_queue and not has_pending_chat_job(chat_id, f"auto_leave_{chat_id}"):
+        schedule_chat_job(
+            context.job_queue,
             leave_if_not_admin,
             when=60,
             data={"chat_id": chat_id},
@@ -364,19 +571,122 @@ async def is_user_admin(chat_id: int, user_id: int, context: ContextTypes.DEFAUL
     return False
 
 async def get_admin_set(chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> set[int]:
-    now = int(time.time())
-    last = ADMIN_LIST_CACHE_TS.get(chat_id, 0)
-    if now - last < ADMIN_LIST_TTL and chat_id in ADMIN_LIST_CACHE:
-        return ADMIN_LIST_CACHE[chat_id]
+    now = time.monotonic()
+    cached = USER_ADMIN_CACHE.get(chat_id)
+    if cached and now < cached[1]:
+        USER_ADMIN_CACHE.move_to_end(chat_id)
+        return cached[0]
     try:
         admins = await context.bot.get_chat_administrators(chat_id)
         s = {a.user.id for a in admins}
-        ADMIN_LIST_CACHE[chat_id] = s
-        ADMIN_LIST_CACHE_TS[chat_id] = now
-        return s
-    except Exception:
-        # fallback: old cache if exists
-        return ADMIN_LIST_CACHE.get(chat_id, set())
+        expires_at = now + USER_ADMIN_TTL
+    except TelegramError:
+        # fallback: old cache if exists; remember the failure briefly so a
+        # chat where the lookup keeps failing doesn't cost one RPC per message
+        s = cached[0] if cached else set()
+        expires_at = now + USER_ADMIN_RETRY_SECONDS
+    USER_ADMIN_CACHE[chat_id] = (s, expires_at)
+    USER_ADMIN_CACHE.move_to_end(chat_id)
+    # ✅ LRU cap: a burst of new groups can't grow the cache without bound
+    while len(USER_ADMIN_CACHE) > USER_ADMIN_CACHE_MAX:
+        USER_ADMIN_CACHE.popitem(last=False)
+    return s
+
+# ===============================
+# STATIC TEXTS + KEYBOARDS (built once at import)
+# ===============================
+GROUP_ADMIN_TEXT = (
+    "✅ Bot ကို Admin အဖြစ်ခန့်ထားပြီးသားပါ။\n\n"
+    "🔗 <b>Auto Forward Delete</b>\n"
+    "🚫 <b>Spam Forward Mute</b>\n\n"
+    "🤖 Bot က လက်ရှိ Group မှာ ကောင်းကောင်းအလုပ်လုပ်နေပါပြီး။"
+)
+
+GROUP_NOT_ADMIN_TEXT = (
+    "⚠️ <b>Bot သည် Admin မဟုတ်သေးပါ</b>\n\n"
+    "🤖 <b>Bot ကို အလုပ်လုပ်စေရန်</b>\n"
+    "⭐️ <b>Admin Permission ပေးပါ</b>\n\n"
+    "Required: Delete messages"
+)
+
+DONATE_TEXT = (
+    "<b>🤍 Support Us !</b>\n\n"
+    "မင်းအတွက် အလုပ်ကောင်းကောင်းလုပ်နေတဲ့ Bot ကို Support ပေးနိုင်ပါတယ်။\n\n"
+    "<b>👇 အောက်ကနေ ရွေးပါ</b>"
+)
+
+DONATE_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("⭐️ 𝗦𝗨𝗣𝗣𝗢𝗥𝗧 𝗕𝗢𝗧 (5 Stars)", callback_data="donate_stars_5")],
+    [InlineKeyboardButton("🪙 𝗦𝗨𝗣𝗣𝗢𝗥𝗧 𝗗𝗘𝗩𝗘𝗟𝗢𝗣𝗘𝗥 (TON)", callback_data="donate_ton")],
+    [InlineKeyboardButton("⬅️ Back", callback_data="donate_back_start")],
+])
+
+TON_TEXT = (
+    "<b>🪙 Support Developer (TON)</b>\n\n"
+    f"<b>TON Address:</b>\n<code>{escape(TON_ADDRESS)}</code>\n\n"
+    "✅ Address ကို copy လုပ်ပြီး TON coin ပေးပို့နိုင်ပါတယ်ဗျ။\n"
+    "💙 Thank You For Supporting !"
+)
+
+DONATE_BACK_KEYBOARD = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back", callback_data="donate_menu")]])
+
+START_TEXT_TAIL = (
+    " ! 👋</b>\n\n"
+    "<b>ငါသည် Group များအတွက် Forward ဖျက် Bot တစ်ခုဖြစ်တယ်။</b>\n"
+    "<b>ငါ၏လုပ်နိုင်စွမ်းကို ကောင်းကောင်းအသုံးချပါ။</b>\n\n"
+    "➖➖➖➖➖➖➖➖➖➖➖➖\n\n"
+    "<b>📌 ငါ၏လုပ်နိုင်စွမ်း</b>\n\n"
+    "✅ Auto Forward Delete ( Setting ချိန်းစရာမလိုပဲ ချက်ချင်း အလုပ်လုပ်။ )\n"
+    "✅ Spam Forward Mute ( Forward 3 ခါ လုပ်ရင် 10 မိနစ် Auto Mute ပေး။ )\n\n"
+    "➖➖➖➖➖➖➖➖➖➖➖➖\n\n"
+    "<b>📥 ငါ့ကိုအသုံးပြုရန်</b>\n\n"
+    "➕ ငါ့ကို Group ထဲထည့်ပါ\n"
+    "⭐️ ငါ့ကို Admin ပေးပါ"
+)
+
+@lru_cache(maxsize=None)
+def start_text_head(bot_username: str, bot_first_name: str) -> str:
+    bot_name = escape(bot_first_name or "Bot")
+    bot_mention = (
+        f"<a href='https://t.me/{bot_username}'>{bot_name}</a>"
+        if bot_username else bot_name
+    )
+    return f"<b>────「 {bot_mention} 」────</b>\n\n<b>ဟယ်လို "
+
+def start_caption(bot, user) -> str:
+    # ✅ only the user mention changes per call
+    user_name = escape_text(user.first_name or "User")
+    user_mention = f"<a href='tg://user?id={user.id}'>{user_name}</a>"
+    return start_text_head(bot.username or "", bot.first_name or "") + user_mention + START_TEXT_TAIL
+
+# ===============================
+# KEYBOARDS (built once per bot username)
+# ===============================
+@lru_cache(maxsize=None)
+def start_keyboard(bot_username: str) -> InlineKeyboardMarkup:
+    buttons = []
+    if bot_username:
+        buttons.append([
+            InlineKeyboardButton(
+                "➕ 𝗔𝗗𝗗 𝗠𝗘 𝗧𝗢 𝗬𝗢𝗨𝗥 𝗚𝗥𝗢𝗨𝗣",
+                url=f"https://t.me/{bot_username}?startgroup=true"
+            )
+        ])
+    buttons.append([InlineKeyboardButton("🤍 DONATE US 🤍", callback_data="donate_menu")])
+    buttons.append([
+        InlineKeyboardButton("👨‍💻 𝐃𝐞𝐯𝐞𝐥𝐨𝐩𝐞𝐫", url="tg://user?id=5942810488"),
+        InlineKeyboardButton("📢 𝐂𝐡𝐚𝐧𝐧𝐞𝐥", url="https://t.me/MMTelegramBotss"),
+    ])
+    return InlineKeyboardMarkup(buttons)
+
+@lru_cache(maxsize=None)
+def admin_permission_keyboard(bot_username: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(
+            "⭐ 𝗚𝗜𝗩𝗘 𝗔𝗗𝗠𝗜𝗡 𝗣𝗘𝗥𝗠𝗜𝗦𝗦𝗜𝗢𝗡",
+            url=f"https://t.me/{bot_username}?startgroup=true"
+        )
+    ]])
 
 # ===============================
 # /start + DONATE + PAYMENTS
@@ -393,103 +703,54 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # PRIVATE
     if chat.type == "private":
-        context.application.create_task(
-            safe_db_execute(
-                "INSERT INTO users VALUES (%s) ON CONFLICT DO NOTHING",
-                (user.id,)
-            )
-        )
-
-        user_name = escape(user.first_name or "User")
-        bot_name = escape(bot.first_name or "Bot")
-        user_mention = f"<a href='tg://user?id={user.id}'>{user_name}</a>"
-        bot_mention = (
-            f"<a href='https://t.me/{bot_username}'>{bot_name}</a>"
-            if bot_username else bot_name
-        )
-
-        text = (
-            f"<b>────「 {bot_mention} 」────</b>\n\n"
-            f"<b>ဟယ်လို {user_mention} ! 👋</b>\n\n"
-            "<b>ငါသည် Group များအတွက် Forward ဖျက် Bot တစ်ခုဖြစ်တယ်။</b>\n"
-            "<b>ငါ၏လုပ်နိုင်စွမ်းကို ကောင်းကောင်းအသုံးချပါ။</b>\n\n"
-            "➖➖➖➖➖➖➖➖➖➖➖➖\n\n"
-            "<b>📌 ငါ၏လုပ်နိုင်စွမ်း</b>\n\n"
-            "✅ Auto Forward Delete ( Setting ချိန်းစရာမလိုပဲ ချက်ချင်း အလုပ်လုပ်။ )\n"
-            "✅ Spam Forward Mute ( Forward 3 ခါ လုပ်ရင် 10 မိနစ် Auto Mute ပေး။ )\n\n"
-            "➖➖➖➖➖➖➖➖➖➖➖➖\n\n"
-            "<b>📥 ငါ့ကိုအသုံးပြုရန်</b>\n\n"
-            "➕ ငါ့ကို Group ထဲထည့်ပါ\n"
-            "⭐️ ငါ့ကို Admin ပေးပါ"
-        )
+        PENDING_USERS.add(user.id)
 
-        buttons = []
-        if bot_username:
-            buttons.append([
-                InlineKeyboardButton(
-                    "➕ 𝗔𝗗𝗗 𝗠𝗘 𝗧𝗢 𝗬𝗢𝗨𝗥 𝗚𝗥𝗢𝗨𝗣",
-                    url=f"https://t.me/{bot_username}?startgroup=true"
-                )
-            ])
-        buttons.append([InlineKeyboardButton("🤍 DONATE US 🤍", callback_data="donate_menu")])
-        buttons.append([
-            InlineKeyboardButton("👨‍💻 𝐃𝐞𝐯𝐞𝐥𝐨𝐩𝐞𝐫", url="tg://user?id=5942810488"),
-            InlineKeyboardButton("📢 𝐂𝐡𝐚𝐧𝐧𝐞𝐥", url="https://t.me/MMTelegramBotss"),
-        ])
+        text = start_caption(bot, user)
 
         await msg.reply_photo(
             photo=START_IMAGE,
             caption=text,
             parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup(buttons),
+            reply_markup=start_keyboard(bot_username),
         )
         return
 
     # GROUP
     if chat.type in ("group", "supergroup"):
-        try:
-            me = await bot.get_chat_member(chat.id, bot.id)
-        except:
-            return
-
-        if me.status in ("member", "restricted"):
-            if not getattr(me, "can_send_messages", True):
+        # ✅ known admin chats skip the probe; recent non-admin results are reused
+        is_admin = chat.id in BOT_ADMIN_CACHE
+        if not is_admin:
+            now = time.monotonic()
+            cached = NON_ADMIN_START_CACHE.get(chat.id)
+            if cached and now < cached[1]:
+                can_send = cached[0]
+            else:
+                try:
+                    me = await bot.get_chat_member(chat.id, bot.id)
+                except TelegramError:
+                    return
+                is_admin = me.status in ADMIN_STATUSES
+                can_send = bool(getattr(me, "can_send_messages", True))
+                if not is_admin:
+                    NON_ADMIN_START_CACHE[chat.id] = (can_send, now + NON_ADMIN_START_TTL)
+            if not is_admin and not can_send:
                 return
 
-        if me.status in ("administrator", "creator"):
+        if is_admin:
             try:
-                await bot.send_message(
-                    chat.id,
-                    "✅ Bot ကို Admin အဖြစ်ခန့်ထားပြီးသားပါ။\n\n"
-                    "🔗 <b>Auto Forward Delete</b>\n"
-                    "🚫 <b>Spam Forward Mute</b>\n\n"
-                    "🤖 Bot က လက်ရှိ Group မှာ ကောင်းကောင်းအလုပ်လုပ်နေပါပြီး။",
-                    parse_mode="HTML"
-                )
-            except RetryAfter:
-                return
-            except Exception:
+                await bot.send_message(chat.id, GROUP_ADMIN_TEXT, parse_mode="HTML")
+            except TelegramError:
                 return
             return
 
         try:
             await bot.send_message(
                 chat.id,
-                "⚠️ <b>Bot သည် Admin မဟုတ်သေးပါ</b>\n\n"
-                "🤖 <b>Bot ကို အလုပ်လုပ်စေရန်</b>\n"
-                "⭐️ <b>Admin Permission ပေးပါ</b>\n\n"
-                "Required: Delete messages",
+                GROUP_NOT_ADMIN_TEXT,
                 parse_mode="HTML",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton(
-                        "⭐ 𝗚𝗜𝗩𝗘 𝗔𝗗𝗠𝗜𝗡 𝗣𝗘𝗥𝗠𝗜𝗦𝗦𝗜𝗢𝗡",
-                        url=f"https://t.me/{bot_username}?startgroup=true"
-                    )
-                ]])
+                reply_markup=admin_permission_keyboard(bot_username)
             )
-        except RetryAfter:
-            return
-        except Exception:
+        except TelegramError:
             return
         return
 
@@ -508,73 +769,25 @@ async def donate_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
 
     if data == "donate_menu":
-        donate_text = (
-            "<b>🤍 Support Us !</b>\n\n"
-            "မင်းအတွက် အလုပ်ကောင်းကောင်းလုပ်နေတဲ့ Bot ကို Support ပေးနိုင်ပါတယ်။\n\n"
-            "<b>👇 အောက်ကနေ ရွေးပါ</b>"
+        await query.message.edit_caption(
+            caption=DONATE_TEXT, parse_mode="HTML", reply_markup=DONATE_KEYBOARD
         )
-        kb = InlineKeyboardMarkup([
-            [InlineKeyboardButton("⭐️ 𝗦𝗨𝗣𝗣𝗢𝗥𝗧 𝗕𝗢𝗧 (5 Stars)", callback_data="donate_stars_5")],
-            [InlineKeyboardButton("🪙 𝗦𝗨𝗣𝗣𝗢𝗥𝗧 𝗗𝗘𝗩𝗘𝗟𝗢𝗣𝗘𝗥 (TON)", callback_data="donate_ton")],
-            [InlineKeyboardButton("⬅️ Back", callback_data="donate_back_start")],
-        ])
-        await query.message.edit_caption(caption=donate_text, parse_mode="HTML", reply_markup=kb)
         return
 
     if data == "donate_back_start":
-        user_name = escape(user.first_name or "User")
-        bot_name = escape(bot.first_name or "Bot")
-        user_mention = f"<a href='tg://user?id={user.id}'>{user_name}</a>"
-        bot_mention = (
-            f"<a href='https://t.me/{bot_username}'>{bot_name}</a>"
-            if bot_username else bot_name
-        )
-        start_text = (
-            f"<b>────「 {bot_mention} 」────</b>\n\n"
-            f"<b>ဟယ်လို {user_mention} ! 👋</b>\n\n"
-            "<b>ငါသည် Group များအတွက် Forward ဖျက် Bot တစ်ခုဖြစ်တယ်။</b>\n"
-            "<b>ငါ၏လုပ်နိုင်စွမ်းကို ကောင်းကောင်းအသုံးချပါ။</b>\n\n"
-            "➖➖➖➖➖➖➖➖➖➖➖➖\n\n"
-            "<b>📌 ငါ၏လုပ်နိုင်စွမ်း</b>\n\n"
-            "✅ Auto Forward Delete ( Setting ချိန်းစရာမလိုပဲ ချက်ချင်း အလုပ်လုပ်။ )\n"
-            "✅ Spam Forward Mute ( Forward 3 ခါ လုပ်ရင် 10 မိနစ် Auto Mute ပေး။ )\n\n"
-            "➖➖➖➖➖➖➖➖➖➖➖➖\n\n"
-            "<b>📥 ငါ့ကိုအသုံးပြုရန်</b>\n\n"
-            "➕ ငါ့ကို Group ထဲထည့်ပါ\n"
-            "⭐️ ငါ့ကို Admin ပေးပါ"
-        )
-        buttons = []
-        if bot_username:
-            buttons.append([
-                InlineKeyboardButton(
-                    "➕ 𝗔𝗗𝗗 𝗠𝗘 𝗧𝗢 𝗬𝗢𝗨𝗥 𝗚𝗥𝗢𝗨𝗣",
-                    url=f"https://t.me/{bot_username}?startgroup=true"
-                )
-            ])
-        buttons.append([InlineKeyboardButton("🤍 DONATE US 🤍", callback_data="donate_menu")])
-        buttons.append([
-            InlineKeyboardButton("👨‍💻 𝐃𝐞𝐯𝐞𝐥𝐨𝐩𝐞𝐫", url="tg://user?id=5942810488"),
-            InlineKeyboardButton("📢 𝐂𝐡𝐚𝐧𝐧𝐞𝐥", url="https://t.me/MMTelegramBotss"),
-        ])
+        start_text = start_caption(bot, user)
         await query.message.edit_caption(
-            caption=start_text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(buttons)
+            caption=start_text, parse_mode="HTML", reply_markup=start_keyboard(bot_username)
         )
         return
 
     if data == "donate_ton":
-        TON_ADDRESS = os.getenv("TON_ADDRESS", "PUT_YOUR_TON_ADDRESS_HERE")
-        ton_text = (
-            "<b>🪙 Support Developer (TON)</b>\n\n"
-            f"<b>TON Address:</b>\n<code>{escape(TON_ADDRESS)}</code>\n\n"
-            "✅ Address ကို copy လုပ်ပြီး TON coin ပေးပို့နိုင်ပါတယ်ဗျ။\n"
-            "💙 Thank You For Supporting !"
+        await query.message.edit_caption(
+            caption=TON_TEXT, parse_mode="HTML", reply_markup=DONATE_BACK_KEYBOARD
         )
-        kb = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back", callback_data="donate_menu")]])
-        await query.message.edit_caption(caption=ton_text, parse_mode="HTML", reply_markup=kb)
         return
 
     if data == "donate_stars_5":
-        from telegram import LabeledPrice
         try:
             await context.bot.send_invoice(
                 chat_id=query.message.chat.id,
@@ -617,30 +830,31 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if (not chat or chat.type != "private" or not user or user.id != OWNER_ID or not msg):
         return
 
-    now = time.time()
-    if now - STATS_CACHE["last_update"] > STATS_TTL:
-        users = await safe_db_execute(
-            "SELECT COUNT(*) AS c FROM users",
-            fetch=True
-        )
-        groups = await safe_db_execute(
-            "SELECT COUNT(*) AS c FROM groups",
-            fetch=True
-        )
-        admin_groups = await safe_db_execute(
-            "SELECT COUNT(*) AS c FROM groups WHERE is_admin_cached = TRUE",
-            fetch=True
-        )
-
-        if users is None or groups is None or admin_groups is None:
-            await msg.reply_text("⚠️ Stats မတွက်နိုင်ပါ (DB unavailable)")
-            return
+    # single-flight: concurrent /stats during expiry wait for one refresh
+    async with STATS_LOCK:
+        now = time.time()
+        if now - STATS_CACHE["last_update"] > STATS_TTL:
+            # one round-trip; groups is scanned once for both counts
+            rows = await safe_db_execute(
+                """
+                SELECT
+                  (SELECT COUNT(*) FROM users) AS users,
+                  COUNT(*) AS groups,
+                  COUNT(*) FILTER (WHERE is_admin_cached) AS admin_groups
+                FROM groups
+                """,
+                fetch=True
+            )
 
-        STATS_CACHE["users"] = int(users[0]["c"]) if users else 0
-        STATS_CACHE["groups"] = int(groups[0]["c"]) if groups else 0
-        STATS_CACHE["admin_groups"] = int(admin_groups[0]["c"]) if admin_groups else 0
-        STATS_CACHE["last_update"] = now
+            if not rows:
+                await msg.reply_text("⚠️ Stats မတွက်နိုင်ပါ (DB unavailable)")
+                return
 
+            row = rows[0]
+            STATS_CACHE["users"] = int(row["users"])
+            STATS_CACHE["groups"] = int(row["groups"])
+            STATS_CACHE["admin_groups"] = int(row["admin_groups"])
+            STATS_CACHE["last_update"] = now
 
     no_admin = max(0, STATS_CACHE["groups"] - STATS_CACHE["admin_groups"])
     uptime = int(time.time()) - BOT_START_TIME
@@ -685,16 +899,15 @@ async def auto_delete_forwards(update: Update, context: ContextTypes.DEFAULT_TYP
     if await is_user_admin(chat_id, user_id, context):
         return
 
-    try:
-        await msg.delete()
-    except BadRequest as e:
-        rate_limited_log(f"delete_skip_{chat_id}", f"ℹ️ Delete skipped in {chat_id}: {e}")
-        return
-    except Exception as e:
-        rate_limited_log(f"delete_fail_{chat_id}", f"❌ Delete failed in {chat_id}: {e}")
+    # ✅ the delete runs while the spam check looks up permissions; the mute
+    # itself still waits for the delete to succeed
+    delete_task = asyncio.create_task(delete_forward(msg, chat_id))
+    muted = await forward_spam_control(chat_id, chat.type, user_id, context, delete_task)
+    if not await delete_task:
+        # the forward is still there: it must not count towards a mute
+        if not muted:
+            uncount_forward(chat_id, user_id)
         return
-
-    muted = await forward_spam_control(chat_id, chat.type, user_id, context)
     
     now = int(time.time())
     wkey = (chat_id, user_id)
@@ -703,7 +916,11 @@ async def auto_delete_forwards(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     RECENT_WARN_CACHE[wkey] = now
     
-    name = escape(user.first_name or "User")
+    # ✅ a forward raid must not push the group past its per-chat send limit
+    if not group_send_allowed(chat_id):
+        return
+
+    name = escape_text(user.first_name or "User")
     user_mention = f'<a href="tg://user?id={user.id}">{name}</a>'
 
     if not muted:
@@ -716,8 +933,8 @@ async def auto_delete_forwards(update: Update, context: ContextTypes.DEFAULT_TYP
             )
         except RetryAfter:
             pass
-        except:
-            pass
+        except TelegramError as e:
+            rate_limited_log(f"warn_fail_{chat_id}", f"⚠️ Warn failed in {chat_id}: {e}")
     else:
         try:
             await context.bot.send_message(
@@ -727,56 +944,56 @@ async def auto_delete_forwards(update: Update, context: ContextTypes.DEFAULT_TYP
                 f"⏰ 10 မိနစ် mute လုပ်လိုက်ပါပြီး",
                 parse_mode="HTML"
             )
-        except:
-            pass
+        except TelegramError as e:
+            rate_limited_log(f"warn_fail_{chat_id}", f"⚠️ Warn failed in {chat_id}: {e}")
+
+async def delete_forward(msg, chat_id: int) -> bool:
+    try:
+        await msg.delete()
+        return True
+    except BadRequest as e:
+        rate_limited_log(f"delete_skip_{chat_id}", f"ℹ️ Delete skipped in {chat_id}: {e}")
+    except TelegramError as e:
+        rate_limited_log(f"delete_fail_{chat_id}", f"❌ Delete failed in {chat_id}: {e}")
+    return False
 
-async def forward_spam_control(chat_id: int, chat_type: str, user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
+def uncount_forward(chat_id: int, user_id: int):
+    # undo forward_spam_control's increment; last_time (and so the LRU
+    # position) is left alone, keeping the cache sorted for cleanup
+    key = (chat_id, user_id)
+    entry = FORWARD_SPAM_CACHE.get(key)
+    if not entry:
+        return
+    count, last_time, mute_until = entry
+    if count <= 1:
+        del FORWARD_SPAM_CACHE[key]
+    else:
+        FORWARD_SPAM_CACHE[key] = (count - 1, last_time, mute_until)
+
+async def forward_spam_control(chat_id: int, chat_type: str, user_id: int, context: ContextTypes.DEFAULT_TYPE, deleted: asyncio.Task) -> bool:
     now = int(time.time())
     key = (chat_id, user_id)
 
-    data = FORWARD_SPAM_CACHE.get(key)
-    if data:
-        mute_until = data.get("mute_until", 0)
+    # flat (count, last_time, mute_until) tuples: no per-entry dict
+    entry = FORWARD_SPAM_CACHE.get(key)
+    if entry:
+        count, last_time, mute_until = entry
         if mute_until and now < mute_until:
             return True
+        # last_time only moves forward together with the LRU position, so the
+        # OrderedDict stays sorted by last_time (cleanup relies on that)
+        FORWARD_SPAM_CACHE.move_to_end(key)
         # ✅ ALWAYS count every new forward attempt
-        last_time = int(data.get("last_time", 0))
-        if now - last_time > SPAM_RESET_SECONDS:
-            data["count"] = 1
-        else:
-            data["count"] = int(data.get("count", 0)) + 1
-        data["last_time"] = now
+        count = 1 if now - last_time > SPAM_RESET_SECONDS else count + 1
+        FORWARD_SPAM_CACHE[key] = (count, now, 0)
     else:
-        try:
-            rows = await asyncio.wait_for(
-                safe_db_execute(
-                    """
-                    SELECT count, last_time
-                    FROM forward_spam
-                    WHERE chat_id=%s AND user_id=%s
-                    """,
-                    (chat_id, user_id),
-                    fetch=True
-                ),
-                timeout=2
-            )
-        except:
-            rows = None
-
-        if rows:
-            last_time = rows[0]["last_time"]
-            # ✅ ALWAYS count every new forward attempt (no early return)
-            count = 1 if now - last_time > SPAM_RESET_SECONDS else int(rows[0]["count"]) + 1
-        else:
-            count = 1
+        # counters are short-lived (1h window), so they stay in RAM: no DB on this path
+        count = 1
+        FORWARD_SPAM_CACHE[key] = (count, now, 0)
+        if len(FORWARD_SPAM_CACHE) > FORWARD_SPAM_CACHE_MAX:
+            FORWARD_SPAM_CACHE.popitem(last=False)
 
-        data = {"count": count, "last_time": now}
-        FORWARD_SPAM_CACHE[key] = data
-
-    if data["count"] < FORWARD_LIMIT:
-        context.application.create_task(
-            upsert_forward_spam(chat_id, user_id, data["count"], data["last_time"])
-        )
+    if count < FORWARD_LIMIT:
         return False
 
     if chat_type != "supergroup":
@@ -795,9 +1012,13 @@ async def forward_spam_control(chat_id: int, chat_type: str, user_id: int, conte
             BOT_RESTRICT_CACHE[chat_id] = (can_restrict, now2)
             if not can_restrict:
                 return False
-        except Exception:
+        except TelegramError:
             return False
 
+    # only mute for a forward that was actually removed
+    if not await deleted:
+        return False
+
     try:
         await context.bot.restrict_chat_member(
             chat_id,
@@ -805,18 +1026,11 @@ async def forward_spam_control(chat_id: int, chat_type: str, user_id: int, conte
             ChatPermissions(can_send_messages=False),
             until_date=now + MUTE_SECONDS
         )
-    except:
+    except TelegramError as e:
+        rate_limited_log(f"mute_fail_{chat_id}", f"⚠️ Mute failed in {chat_id}: {e}")
         return False
 
-    FORWARD_SPAM_CACHE[key] = {
-        "count": data.get("count", FORWARD_LIMIT),
-        "last_time": now,
-        "mute_until": now + MUTE_SECONDS
-    }
-
-    context.application.create_task(
-        safe_db_execute("DELETE FROM forward_spam WHERE chat_id=%s AND user_id=%s", (chat_id, user_id))
-    )
+    FORWARD_SPAM_CACHE[key] = (count, now, now + MUTE_SECONDS)
     return True
 
 # ===============================
@@ -859,7 +1073,9 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
 
     # ✅ allow text-only OR media
-    has_any_media = any([content["photo"], content["video"], content["audio"], content["document"]])
+    has_any_media = bool(
+        content["photo"] or content["video"] or content["audio"] or content["document"]
+    )
     has_text = bool(content["text"])
 
     # forward/copy must have a replied message (otherwise it just forwards the command)
@@ -871,7 +1087,7 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await msg.reply_text("❌ Broadcast လုပ်ရန် content မတွေ့ပါ")
         return
 
-    PENDING_BROADCAST[OWNER_ID] = content
+    PENDING_BROADCAST[OWNER_ID] = (content, time.monotonic() + PENDING_BROADCAST_TTL)
 
     keyboard = InlineKeyboardMarkup([[
         InlineKeyboardButton("✅ CONFIRM", callback_data="broadcast_confirm"),
@@ -891,7 +1107,7 @@ async def broadcast_confirm_handler(update: Update, context: ContextTypes.DEFAUL
         await query.answer()
         return
     await query.answer()
-    if OWNER_ID not in PENDING_BROADCAST:
+    if get_pending_broadcast() is None:
         await query.edit_message_text("❌ Broadcast data မရှိပါ")
         return
 
@@ -908,8 +1124,25 @@ async def broadcast_confirm_handler(update: Update, context: ContextTypes.DEFAUL
         reply_markup=keyboard
     )
 
+# BadRequest texts that mean the target is gone for good (same as Forbidden for cleanup)
+DEAD_TARGET_ERRORS = ("chat not found", "peer_id_invalid", "user not found")
+
+def is_dead_target_error(e: BadRequest) -> bool:
+    text = str(e).lower()
+    return any(s in text for s in DEAD_TARGET_ERRORS)
+
+def is_unsent_error(e: NetworkError) -> bool:
+    # PTB maps httpx.PoolTimeout to TimedOut("Pool timeout: ... not sent ...") and
+    # connect failures to NetworkError("httpx.ConnectError: ..."); both fail
+    # before the request is written, so they are the only safe ones to retry
+    text = str(e)
+    if isinstance(e, TimedOut):
+        return text.startswith("Pool timeout")
+    return "ConnectError" in text
+
 async def safe_send(func, *args, **kwargs):
-    for _ in range(5):
+    for attempt in range(SEND_MAX_ATTEMPTS):
+        await SEND_LIMITER.acquire()
         try:
             return await func(*args, **kwargs)
         except ChatMigrated as e:
@@ -920,42 +1153,40 @@ async def safe_send(func, *args, **kwargs):
                 
                 try:
                     me = await ctx.bot.get_chat_member(new_chat_id, ctx.bot.id)   
-                    is_admin = me.status in ("administrator", "creator") and getattr(me, "can_delete_messages", False)
-                except Exception:
+                    is_admin = me.status in ADMIN_STATUSES and getattr(me, "can_delete_messages", False)
+                except TelegramError:
                     is_admin = False
                 
-                ctx.application.create_task(
-                    safe_db_execute(
-                        """
-                        INSERT INTO groups (group_id, is_admin_cached, last_checked_at)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (group_id)
-                        DO UPDATE SET
-                          is_admin_cached = EXCLUDED.is_admin_cached,
-                          last_checked_at = EXCLUDED.last_checked_at
-                        """,
-                        (new_chat_id, is_admin, int(time.time()))
-                    )
-                )
-                ctx.application.create_task(
-                    safe_db_execute("DELETE FROM groups WHERE group_id=%s", (old_chat_id,))
-                )
+                queue_group_upsert(new_chat_id, is_admin, int(time.time()))
+                queue_db_write("DELETE FROM groups WHERE group_id=%s", (old_chat_id,))
                 new_args = (args[0], new_chat_id, *args[2:])
                 args = new_args
                 continue
             except Exception:
                 return None
         except RetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-        except (Forbidden, BadRequest):
+            # the next acquire() waits this out for every concurrent sender
+            SEND_LIMITER.backoff(e.retry_after)
+        # Forbidden is not caught: the caller records the dead target for batch cleanup
+        except BadRequest as e:
+            if is_dead_target_error(e):
+                raise
             return None
+        except NetworkError as e:
+            # ✅ only retry when the request provably never reached Telegram;
+            # a read/write timeout has usually been delivered already, and a
+            # retry would send the same broadcast to the user again
+            if not is_unsent_error(e):
+                return None
+            # exponential backoff with jitter so concurrent senders don't retry in lockstep
+            await asyncio.sleep(min(SEND_BACKOFF_MAX, 2 ** attempt) * random.uniform(0.5, 1.5))
     return None
 
 async def broadcast_target_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    data = PENDING_BROADCAST.pop(OWNER_ID, None)
+    data = get_pending_broadcast(pop=True)
     if not data:
         await query.edit_message_text("❌ Broadcast data မရှိပါ")
         return
@@ -970,36 +1201,85 @@ async def broadcast_target_handler(update: Update, context: ContextTypes.DEFAULT
     attempted = 0
     start_time = time.time()
 
-    total = 0
+    # ✅ one round-trip, counting only the tables this broadcast targets
+    count_parts = []
     if target_type in ("bc_target_users", "bc_target_all"):
-        rows = await safe_db_execute("SELECT COUNT(*) AS c FROM users", fetch=True)
-        total += int(rows[0]["c"]) if rows else 0
+        count_parts.append("(SELECT COUNT(*) FROM users)")
     if target_type in ("bc_target_groups", "bc_target_all"):
+        count_parts.append("(SELECT COUNT(*) FROM groups WHERE is_admin_cached = TRUE)")
+    total = 0
+    if count_parts:
         rows = await safe_db_execute(
-            "SELECT COUNT(*) AS c FROM groups WHERE is_admin_cached = TRUE",
+            f"SELECT {' + '.join(count_parts)} AS total",
             fetch=True
         )
-        total += int(rows[0]["c"]) if rows else 0
-
-    async def send_batch(ids):
-        nonlocal sent, attempted
-        for cid in ids:
-            res = await safe_send(send_content, context, cid, data)
-            attempted += 1
-            if res:
-                sent += 1
-            if attempted % 50 == 0 or attempted == total:
-                await update_progress(progress_msg, attempted, total)
+        total = int(rows[0]["total"] or 0) if rows else 0
+
+    # blocked / kicked targets, removed in one statement per table and flush
+    dead_users: list[int] = []
+    dead_groups: list[int] = []
+
+    async def flush_dead():
+        if dead_users:
+            ids = dead_users[:]
+            dead_users.clear()
+            await safe_db_execute("DELETE FROM users WHERE user_id = ANY(%s)", (ids,))
+        if dead_groups:
+            ids = dead_groups[:]
+            dead_groups.clear()
+            await safe_db_execute("DELETE FROM groups WHERE group_id = ANY(%s)", (ids,))
+
+    # content is resolved once, not per target
+    send_content = make_sender(data)
+    sem = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    last_edit = 0.0
+    last_percent = 0  # the initial message already shows 0%
+    progress_task = None
+
+    async def send_one(cid, dead):
+        nonlocal sent, attempted, last_edit, last_percent, progress_task
+        async with sem:
+            try:
+                res = await safe_send(send_content, context, cid)
+            except (Forbidden, BadRequest):
+                # BadRequest only gets here for a dead target (see is_dead_target_error)
+                dead.append(cid)
+                res = None
+        attempted += 1
+        if res:
+            sent += 1
+        # time-throttled, off the send path; never more than one edit in flight
+        now = time.monotonic()
+        if (
+            (attempted == total or now - last_edit >= PROGRESS_EDIT_INTERVAL)
+            and (progress_task is None or progress_task.done())
+        ):
+            # same percent = same text: skip the edit (Telegram rejects it as "not modified")
+            percent = progress_percent(attempted, total)
+            if percent != last_percent:
+                last_edit = now
+                last_percent = percent
+                progress_task = asyncio.create_task(update_progress(progress_msg, attempted, total))
+
+    async def send_batch(ids, dead):
+        # overlap network latency across the page; the limiter keeps us under 30/s
+        await asyncio.gather(*(send_one(cid, dead) for cid in ids), return_exceptions=True)
+        if len(dead) >= DEAD_FLUSH_SIZE:
+            await flush_dead()
 
     if target_type in ("bc_target_users", "bc_target_all"):
-        async for rows in iter_db_ids("SELECT user_id FROM users ORDER BY user_id"):
-            await send_batch([r["user_id"] for r in rows])
+        async for ids in iter_db_ids("users", "user_id"):
+            await send_batch(ids, dead_users)
 
     if target_type in ("bc_target_groups", "bc_target_all"):
-        async for rows in iter_db_ids(
-            "SELECT group_id FROM groups WHERE is_admin_cached = TRUE ORDER BY group_id"
-        ):
-            await send_batch([r["group_id"] for r in rows])
+        async for ids in iter_db_ids("groups", "group_id", "is_admin_cached = TRUE"):
+            await send_batch(ids, dead_groups)
+
+    await flush_dead()
+
+    if progress_task is not None:
+        # don't let a late progress edit overwrite the summary
+        await progress_task
 
     elapsed = int(time.time() - start_time)
     await progress_msg.edit_text(
@@ -1021,103 +1301,94 @@ async def broadcast_cancel_handler(update: Update, context: ContextTypes.DEFAULT
     PENDING_BROADCAST.pop(OWNER_ID, None)
     await query.edit_message_text("❌ Broadcast Cancel လုပ်လိုက်ပါပြီ")
 
-async def send_content(context, chat_id, data):
+def make_sender(data):
+    """Resolve the broadcast content once; returns send(context, chat_id) for safe_send."""
     mode = data.get("mode", "content")
 
     # 1) forward/copy mode
     if mode in ("forward", "copy"):
         from_chat_id = data.get("from_chat_id")
         message_id = data.get("message_id")
-        if not from_chat_id or not message_id:
-            return None
-        try:
-            override_raw = (data.get("text") or "").strip() 
-            override_text = escape(override_raw) if override_raw else ""
-            
+        override_raw = (data.get("text") or "").strip()
+        override_text = escape(override_raw) if override_raw else ""
+        # chats that already got the override: a safe_send retry of the
+        # copy/forward must not send the text a second time
+        override_sent: set[int] = set()
+
+        async def send_override(context, chat_id):
+            if chat_id in override_sent:
+                return
+            override_sent.add(chat_id)
+            try:
+                await context.bot.send_message(
+                    chat_id=chat_id,
+                    text=override_text,
+                    parse_mode="HTML"
+                )
+            except TelegramError:
+                pass
+
+        async def send(context, chat_id):
+            if not from_chat_id or not message_id:
+                return None
             if mode == "forward":
                 res = await context.bot.forward_message(
                     chat_id=chat_id,
                     from_chat_id=from_chat_id,
                     message_id=message_id
                 )
-            
                 # Optional: allow extra text with forward by sending a follow-up message
                 if override_text:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=chat_id,
-                            text=override_text,
-                            parse_mode="HTML"
-                        )
-                    except Exception:
-                        pass
+                    await send_override(context, chat_id)
                 return res
-            else:
-                # IMPORTANT:
-                # - caption only works for media messages
-                # - text-only messages cannot accept caption (BadRequest)
-                if override_text:
-                    # safest: send override text first, then copy original message as-is
-                    try:
-                        await context.bot.send_message(
-                            chat_id=chat_id,
-                            text=override_text,
-                            parse_mode="HTML"
-                        )
-                    except Exception:
-                        pass
-                return await context.bot.copy_message(
-                    chat_id=chat_id,
-                    from_chat_id=from_chat_id,
-                    message_id=message_id
-                )
-        
-        except (Forbidden, BadRequest):
+            # IMPORTANT:
+            # - caption only works for media messages
+            # - text-only messages cannot accept caption (BadRequest)
+            if override_text:
+                # safest: send override text first, then copy original message as-is
+                await send_override(context, chat_id)
+            return await context.bot.copy_message(
+                chat_id=chat_id,
+                from_chat_id=from_chat_id,
+                message_id=message_id
+            )
+
+    # 2) your existing "content" mode (send_photo/send_video/etc)
+    else:
+        text = escape(data.get("text") or "")
+        method, kwargs = None, None
+        for key in ("photo", "video", "audio", "document"):
+            if data.get(key):
+                method = f"send_{key}"
+                kwargs = {key: data[key], "caption": text if text else None, "parse_mode": "HTML"}
+                break
+        else:
+            if text:
+                method = "send_message"
+                kwargs = {"text": text, "parse_mode": "HTML"}
+
+        async def send(context, chat_id):
+            if method is None:
+                return None
+            return await getattr(context.bot, method)(chat_id=chat_id, **kwargs)
+
+    async def send_content(context, chat_id):
+        try:
+            return await send(context, chat_id)
+        except (Forbidden, RetryAfter, ChatMigrated):
+            # safe_send handles these (dead target / 429 backoff / migration)
+            raise
+        except BadRequest as e:
+            if is_dead_target_error(e):
+                raise
             return None
-        except Exception:
+        except NetworkError:
+            # safe_send decides: retry only if the request was never sent
+            raise
+        except TelegramError:
             return None
 
-    # 2) your existing "content" mode (send_photo/send_video/etc)
-    text = escape(data.get("text") or "")
-    try:
-        if data.get("photo"):
-            return await context.bot.send_photo(
-                chat_id=chat_id,
-                photo=data["photo"],
-                caption=text if text else None,
-                parse_mode="HTML"
-            )
-        if data.get("video"):
-            return await context.bot.send_video(
-                chat_id=chat_id,
-                video=data["video"],
-                caption=text if text else None,
-                parse_mode="HTML"
-            )
-        if data.get("audio"):
-            return await context.bot.send_audio(
-                chat_id=chat_id,
-                audio=data["audio"],
-                caption=text if text else None,
-                parse_mode="HTML"
-            )
-        if data.get("document"):
-            return await context.bot.send_document(
-                chat_id=chat_id,
-                document=data["document"],
-                caption=text if text else None,
-                parse_mode="HTML"
-            )
-        if text:
-            return await context.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                parse_mode="HTML"
-            )
-    except (Forbidden, BadRequest):
-        return None
-    except Exception:
-        return None
+    return send_content
 
 # ===============================
 # CHAT MEMBER EVENTS
@@ -1128,37 +1399,39 @@ async def leave_if_not_admin(context: ContextTypes.DEFAULT_TYPE):
     chat_id = context.job.data.get("chat_id")
     if not chat_id:
         return
+    # last job of the chat's reminder flow: drop whatever is still pending
+    clear_reminders(context, chat_id)
 
     try:
         me = await context.bot.get_chat_member(chat_id, context.bot.id)
-        if me.status in ("administrator", "creator"):
+        if me.status in ADMIN_STATUSES:
             BOT_ADMIN_CACHE.add(chat_id)
             return
-    except:
+    except TelegramError:
         pass
 
     BOT_ADMIN_CACHE.discard(chat_id)
     USER_ADMIN_CACHE.pop(chat_id, None)
     REMINDER_MESSAGES.pop(chat_id, None)
+    DB_ADMIN_TRUE.pop(chat_id, None)
 
-    context.application.create_task(
-        safe_db_execute(
-            """
+    # one statement for the whole cleanup (data-modifying CTE)
+    queue_db_write(
+        """
+        WITH marked AS (
             UPDATE groups
             SET is_admin_cached = FALSE,
                 last_checked_at = %s
             WHERE group_id = %s
-            """,
-            (int(time.time()), chat_id)
         )
-    )
-    context.application.create_task(
-        safe_db_execute("DELETE FROM forward_spam WHERE chat_id=%s", (chat_id,))
+        DELETE FROM forward_spam WHERE chat_id = %s
+        """,
+        (int(time.time()), chat_id, chat_id)
     )
 
     try:
         await context.bot.leave_chat(chat_id)
-    except Exception as e:
+    except TelegramError as e:
         print(f"⚠️ Leave chat failed ({chat_id}):", e)
 
 async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1169,8 +1442,7 @@ async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     USER_ADMIN_CACHE.pop(chat.id, None)
-    ADMIN_LIST_CACHE.pop(chat.id, None)
-    ADMIN_LIST_CACHE_TS.pop(chat.id, None)
+    NON_ADMIN_START_CACHE.pop(chat.id, None)
     
     old = update.my_chat_member.old_chat_member
     new = update.my_chat_member.new_chat_member
@@ -1188,23 +1460,15 @@ async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         clear_reminders(context, chat.id)
 
-        for mid in REMINDER_MESSAGES.pop(chat.id, []):
-            with contextlib.suppress(Exception):
-                await context.bot.delete_message(chat.id, mid)
-
-        context.application.create_task(
-            safe_db_execute(
-                """
-                INSERT INTO groups (group_id, is_admin_cached, last_checked_at)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (group_id)
-                DO UPDATE SET
-                    is_admin_cached = EXCLUDED.is_admin_cached,
-                    last_checked_at = EXCLUDED.last_checked_at
-                """,
-                (chat.id, is_ok, int(time.time()))
+        # ✅ delete the stale reminders concurrently (one RTT, not one per message)
+        mids = REMINDER_MESSAGES.pop(chat.id, [])
+        if mids:
+            await asyncio.gather(
+                *(context.bot.delete_message(chat.id, mid) for mid in mids),
+                return_exceptions=True
             )
-        )
+
+        queue_group_upsert(chat.id, is_ok, int(time.time()))
 
         try:
             await context.bot.send_message(
@@ -1216,15 +1480,16 @@ async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "🏃‍♂️‍➡️ စတင်အလုပ်လုပ်နေပါပြီး........!",
                 parse_mode="HTML"
             )
-        except:
+        except TelegramError:
             pass
         return
 
-    if (old.user.id == bot_id and old.status in ("administrator", "creator") and new.status in ("member", "left", "kicked")):
+    if (old.user.id == bot_id and old.status in ADMIN_STATUSES and new.status in ("member", "left", "kicked")):
         BOT_ADMIN_CACHE.discard(chat.id)
         clear_reminders(context, chat.id)
         if context.job_queue:
-            context.job_queue.run_once(
+            schedule_chat_job(
+                context.job_queue,
                 leave_if_not_admin,
                 when=60,
                 data={"chat_id": chat.id},
@@ -1236,13 +1501,8 @@ async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
         BOT_ADMIN_CACHE.discard(chat.id)
         clear_reminders(context, chat.id)
         try:
-            me = await context.bot.get_me()
-            keyboard = InlineKeyboardMarkup([[
-                InlineKeyboardButton(
-                    "⭐ 𝗚𝗜𝗩𝗘 𝗔𝗗𝗠𝗜𝗡 𝗣𝗘𝗥𝗠𝗜𝗦𝗦𝗜𝗢𝗡",
-                    url=f"https://t.me/{me.username}?startgroup=true"
-                )
-            ]])
+            # bot identity is fetched once by Application.initialize(); no get_me() RTT
+            keyboard = admin_permission_keyboard(context.bot.username)
             m = await context.bot.send_message(
                 chat.id,
                 "⚠️ <b>Admin Permission Required</b>\n\n"
@@ -1253,55 +1513,51 @@ async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             REMINDER_MESSAGES.setdefault(chat.id, []).append(m.message_id)
             if context.job_queue:
-                for i in range(1, 6):
-                    context.job_queue.run_once(
-                        admin_reminder,
-                        when=300 * i,
-                        data={"chat_id": chat.id, "count": i, "total": 5, "type": "admin_reminder"}
-                    )
-                context.job_queue.run_once(
-                    leave_if_not_admin,
-                    when=1510,
-                    data={"chat_id": chat.id},
-                    name=f"auto_leave_{chat.id}"
+                # ✅ one pending job per chat: each reminder schedules the next,
+                # the last one schedules the auto-leave
+                schedule_chat_job(
+                    context.job_queue,
+                    admin_reminder,
+                    when=REMINDER_INTERVAL,
+                    data={"chat_id": chat.id, "count": 1, "total": REMINDER_TOTAL, "type": "admin_reminder"},
+                    name=f"admin_reminder_{chat.id}"
                 )
-        except:
+        except TelegramError:
             pass
 
 async def admin_reminder(context: ContextTypes.DEFAULT_TYPE):
     if not context.job or not context.job.data:
         return
     chat_id = context.job.data.get("chat_id")
-    count = context.job.data.get("count")
-    total = context.job.data.get("total")
+    count = context.job.data.get("count", 1)
+    total = context.job.data.get("total", REMINDER_TOTAL)
     if not chat_id:
         return
 
+    # this run is done; keep CHAT_JOBS to the one job still pending
+    jobs = CHAT_JOBS.get(chat_id)
+    if jobs and context.job in jobs:
+        jobs.remove(context.job)
+
     if chat_id in BOT_ADMIN_CACHE:
         clear_reminders(context, chat_id)
         return
 
     try:
         me = await context.bot.get_chat_member(chat_id, context.bot.id)
-    except Exception:
+    except TelegramError:
         clear_reminders(context, chat_id)
         BOT_ADMIN_CACHE.discard(chat_id)
         REMINDER_MESSAGES.pop(chat_id, None)
         return
 
-    if me.status in ("administrator", "creator"):
+    if me.status in ADMIN_STATUSES:
         BOT_ADMIN_CACHE.add(chat_id)
         clear_reminders(context, chat_id)
         return
 
     try:
-        bot = await context.bot.get_me()
-        keyboard = InlineKeyboardMarkup([[
-            InlineKeyboardButton(
-                "⭐ 𝗚𝗜𝗩𝗘 𝗔𝗗𝗠𝗜𝗡 𝗣𝗘𝗥𝗠𝗜𝗦𝗦𝗜𝗢𝗡",
-                url=f"https://t.me/{bot.username}?startgroup=true"
-            )
-        ]])
+        keyboard = admin_permission_keyboard(context.bot.username)
         m = await context.bot.send_message(
             chat_id,
             f"⏰ <b>Reminder ({count}/{total})</b>\n\n"
@@ -1312,10 +1568,30 @@ async def admin_reminder(context: ContextTypes.DEFAULT_TYPE):
             reply_markup=keyboard
         )
         REMINDER_MESSAGES.setdefault(chat_id, []).append(m.message_id)
-    except Exception:
+    except TelegramError:
         clear_reminders(context, chat_id)
         BOT_ADMIN_CACHE.discard(chat_id)
         REMINDER_MESSAGES.pop(chat_id, None)
+        return
+
+    if not context.job_queue:
+        return
+    if count < total:
+        schedule_chat_job(
+            context.job_queue,
+            admin_reminder,
+            when=REMINDER_INTERVAL,
+            data={**context.job.data, "count": count + 1},
+            name=f"admin_reminder_{chat_id}"
+        )
+    else:
+        schedule_chat_job(
+            context.job_queue,
+            leave_if_not_admin,
+            when=AUTO_LEAVE_GRACE,
+            data={"chat_id": chat_id},
+            name=f"auto_leave_{chat_id}"
+        )
 
 # ===============================
 # GROUP COMMANDS
@@ -1337,26 +1613,12 @@ async def refresh(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     BOT_ADMIN_CACHE.discard(chat_id)
     USER_ADMIN_CACHE.pop(chat_id, None)
-    ADMIN_LIST_CACHE.pop(chat_id, None)
-    ADMIN_LIST_CACHE_TS.pop(chat_id, None)
 
     try:
         me = await context.bot.get_chat_member(chat_id, context.bot.id)
-        if me.status in ("administrator", "creator") and me.can_delete_messages:
+        if me.status in ADMIN_STATUSES and getattr(me, "can_delete_messages", False):
             BOT_ADMIN_CACHE.add(chat_id)
-            context.application.create_task(
-                safe_db_execute(
-                    """
-                    INSERT INTO groups (group_id, is_admin_cached, last_checked_at)
-                    VALUES (%s, TRUE, %s)
-                    ON CONFLICT (group_id)
-                    DO UPDATE SET
-                      is_admin_cached = TRUE,
-                      last_checked_at = EXCLUDED.last_checked_at
-                    """,
-                    (chat_id, int(time.time()))
-                )
-            )
+            queue_group_upsert(chat_id, True, int(time.time()))
         else:
             await msg.reply_text(
                 "⚠️ <b>Bot မှာ Delete permission မရှိပါ</b>\n\n"
@@ -1365,7 +1627,7 @@ async def refresh(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 parse_mode="HTML"
             )
             return
-    except:
+    except TelegramError:
         return
 
     await msg.reply_text(
@@ -1379,100 +1641,75 @@ async def refresh(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # STARTUP HELPERS
 # ===============================
 async def refresh_admin_cache(app):
-    rows = await safe_db_execute(
+    group_ids = await safe_db_execute(
         "SELECT group_id FROM groups WHERE is_admin_cached = TRUE",
-        fetch=True
+        fetch="column"
     ) or []
 
     BOT_ADMIN_CACHE.clear()
     verified = 0
     skipped = 0
     now = int(time.time())
+    sem = asyncio.Semaphore(REFRESH_CONCURRENCY)
+    # gid -> verified admin flag, written back in one UPDATE after the scan
+    results: dict[int, bool] = {}
+
+    async def check(gid):
+        nonlocal verified, skipped
+        me = await app.bot.get_chat_member(gid, app.bot.id)
+        is_admin = me.status in ADMIN_STATUSES and bool(getattr(me, "can_delete_messages", False))
+        if is_admin:
+            BOT_ADMIN_CACHE.add(gid)
+            verified += 1
+        else:
+            skipped += 1
+        results[gid] = is_admin
 
-    for row in rows:
-        gid = row["group_id"]
-        try:
-            me = await app.bot.get_chat_member(gid, app.bot.id)
-            if me.status in ("administrator", "creator") and getattr(me, "can_delete_messages", False):
-                BOT_ADMIN_CACHE.add(gid)
-                verified += 1
-                await safe_db_execute(
-                    """
-                    UPDATE groups
-                    SET is_admin_cached = TRUE,
-                        last_checked_at = %s
-                    WHERE group_id = %s
-                    """,
-                    (now, gid)
-                )
-            else:
-                skipped += 1
-                await safe_db_execute(
-                    """
-                    UPDATE groups
-                    SET is_admin_cached = FALSE,
-                        last_checked_at = %s
-                    WHERE group_id = %s
-                    """,
-                    (now, gid)
-                )
-        except ChatMigrated as e:
-            new_id = e.new_chat_id
-            # ✅ DB migrate old->new (upsert new row + remove old row)
-            await safe_db_execute(
-                """
-                INSERT INTO groups (group_id, is_admin_cached, last_checked_at)
-                VALUES (%s, TRUE, %s)
-                ON CONFLICT (group_id)
-                DO UPDATE SET
-                  is_admin_cached = TRUE,
-                  last_checked_at = EXCLUDED.last_checked_at
-                """,
-                (new_id, now)
-            )
-            await safe_db_execute("DELETE FROM groups WHERE group_id=%s", (gid,))
-            # ✅ RAM migrate
-            if gid in BOT_ADMIN_CACHE:
-                BOT_ADMIN_CACHE.discard(gid)
-                BOT_ADMIN_CACHE.add(new_id)
-            USER_ADMIN_CACHE[new_id] = USER_ADMIN_CACHE.pop(gid, set())
-            REMINDER_MESSAGES[new_id] = REMINDER_MESSAGES.pop(gid, [])
-            for (cid, uid), v in list(FORWARD_SPAM_CACHE.items()):
-                if cid == gid:
-                    FORWARD_SPAM_CACHE[(new_id, uid)] = v
-                    FORWARD_SPAM_CACHE.pop((cid, uid), None)
-            # ✅ retry admin check using new_id (same loop iteration)
+    async def refresh_one(gid):
+        async with sem:
+            # ✅ bounded fan-out; shares the bot-wide budget with broadcast sends
+            await SEND_LIMITER.acquire()
             try:
-                me2 = await app.bot.get_chat_member(new_id, app.bot.id)
-                if me2.status in ("administrator", "creator") and getattr(me2, "can_delete_messages", False):
+                await check(gid)
+            except ChatMigrated as e:
+                new_id = e.new_chat_id
+                # ✅ DB migrate old->new (upsert new row + remove old row)
+                await upsert_group(new_id, True, now)
+                await safe_db_execute("DELETE FROM groups WHERE group_id=%s", (gid,))
+                # ✅ RAM migrate
+                if gid in BOT_ADMIN_CACHE:
+                    BOT_ADMIN_CACHE.discard(gid)
                     BOT_ADMIN_CACHE.add(new_id)
-                    verified += 1
-                    await safe_db_execute(
-                        """
-                        UPDATE groups
-                        SET is_admin_cached = TRUE,
-                            last_checked_at = %s
-                        WHERE group_id = %s
-                        """,
-                        (now, new_id)
-                    )
-                else:
-                    skipped += 1
-                    await safe_db_execute(
-                        """
-                        UPDATE groups
-                        SET is_admin_cached = FALSE,
-                            last_checked_at = %s
-                        WHERE group_id = %s
-                        """,
-                        (now, new_id)
-                    )
-            except Exception as e2:
-                print(f"⚠️ Skip migrated admin check for {new_id}: {e2}", flush=True)
-        except Exception as e:
-            print(f"⚠️ Skip admin check for {gid}: {e}", flush=True)
+                USER_ADMIN_CACHE.pop(gid, None)
+                REMINDER_MESSAGES[new_id] = REMINDER_MESSAGES.pop(gid, [])
+                for (cid, uid), v in list(FORWARD_SPAM_CACHE.items()):
+                    if cid == gid:
+                        FORWARD_SPAM_CACHE[(new_id, uid)] = v
+                        FORWARD_SPAM_CACHE.pop((cid, uid), None)
+                # ✅ retry admin check using new_id
+                try:
+                    await check(new_id)
+                except Exception as e2:
+                    print(f"⚠️ Skip migrated admin check for {new_id}: {e2}", flush=True)
+            except Exception as e:
+                print(f"⚠️ Skip admin check for {gid}: {e}", flush=True)
 
-        await asyncio.sleep(0.2)
+    await asyncio.gather(*(refresh_one(gid) for gid in group_ids))
+
+    if results:
+        # ✅ one statement for every checked group instead of one UPDATE each
+        await safe_db_execute(
+            """
+            UPDATE groups
+            SET is_admin_cached = v.is_admin,
+                last_checked_at = %s
+            FROM unnest(%s::bigint[], %s::boolean[]) AS v(group_id, is_admin)
+            WHERE groups.group_id = v.group_id
+            """,
+            (now, list(results.keys()), list(results.values()))
+        )
+        for gid, is_admin in results.items():
+            track_db_admin(gid, is_admin, now)
 
     print(f"✅ Admin cache verified: {verified}", flush=True)
     print(f"⚠️ Non-admin groups marked: {skipped}", flush=True)
@@ -1494,26 +1731,32 @@ async def refresh_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     msg = update.effective_message
 
-    rows = await safe_db_execute("SELECT group_id FROM groups", fetch=True) or []
+    group_ids = await safe_db_execute("SELECT group_id FROM groups", fetch="column") or []
     BOT_ADMIN_CACHE.clear()
 
     verified = 0
     skipped = 0
     failed = 0
+    sem = asyncio.Semaphore(REFRESH_CONCURRENCY)
 
-    for row in rows:
-        gid = row["group_id"]
-        try:
-            me = await context.bot.get_chat_member(gid, context.bot.id)
-            if me.status in ("administrator", "creator"):
-                BOT_ADMIN_CACHE.add(gid)
-                verified += 1
-            else:
-                skipped += 1
-        except Exception as e:
-            print(f"⚠️ refresh_all skip {gid}: {e}")
-            failed += 1
-        await asyncio.sleep(0.1)
+    async def probe(gid):
+        nonlocal verified, skipped, failed
+        async with sem:
+            # shares the bot-wide budget with broadcast sends
+            await SEND_LIMITER.acquire()
+            try:
+                me = await context.bot.get_chat_member(gid, context.bot.id)
+            except Exception as e:
+                print(f"⚠️ refresh_all skip {gid}: {e}")
+                failed += 1
+                return
+        if me.status in ADMIN_STATUSES:
+            BOT_ADMIN_CACHE.add(gid)
+            verified += 1
+        else:
+            skipped += 1
+
+    await asyncio.gather(*(probe(gid) for gid in group_ids))
 
     await msg.reply_text(
         "🔄 <b>Refresh All Completed (SAFE)</b>\n\n"
@@ -1532,7 +1775,12 @@ def main():
     if not BOT_TOKEN:
         raise RuntimeError("BOT_TOKEN missing")
 
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(UPDATE_CONCURRENCY)
+        .build()
+    )
 
     # Commands
     app.add_handler(CommandHandler("start", start))
@@ -1548,16 +1796,17 @@ def main():
     # Chat member
     app.add_handler(ChatMemberHandler(on_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
 
-    # Auto delete forwards
+    # Auto delete forwards (only forwarded group messages are dispatched)
     app.add_handler(
-        MessageHandler(filters.ChatType.GROUPS | filters.ChatType.SUPERGROUP, auto_delete_forwards),
+        MessageHandler(filters.ChatType.GROUPS & filters.FORWARDED, auto_delete_forwards),
         group=0
     )
 
     # Broadcast
     app.add_handler(
         MessageHandler(
-            filters.User(OWNER_ID) & (filters.TEXT | filters.PHOTO | filters.VIDEO | filters.AUDIO | filters.Document.ALL),
+            # DM-only: group messages other than forwards now fall through to here
+            filters.ChatType.PRIVATE & filters.User(OWNER_ID) & (filters.TEXT | filters.PHOTO | filters.VIDEO | filters.AUDIO | filters.Document.ALL),
             broadcast
         )
     )
@@ -1576,7 +1825,7 @@ def main():
         await app.bot.delete_webhook(drop_pending_updates=True)
 
         try:
-            pool = ConnectionPool(
+            pool = AsyncConnectionPool(
                 conninfo=(
                     f"host={DB_HOST} "
                     f"dbname={DB_NAME} "
@@ -1585,11 +1834,14 @@ def main():
                     f"port={DB_PORT} "
                     f"sslmode=require"
                 ),
-                min_size=1,
-                max_size=5,
+                min_size=2,
+                max_size=10,
                 timeout=5,
-                kwargs={"prepare_threshold": None}
+                kwargs={"prepare_threshold": None},
+                open=False,
             )
+            # open explicitly (implicit open in the constructor is deprecated)
+            await pool.open()
             print("✅ DB pool created", flush=True)
         except Exception as e:
             print("❌ DB pool creation failed (BOT WILL CONTINUE WITHOUT DB):", e, flush=True)
@@ -1602,6 +1854,7 @@ def main():
             now = await refresh_admin_cache(app)
             print("✅ Admin cache refreshed", flush=True)
             await purge_non_admin_groups_verified(now)
+            app.bot_data["db_writer"] = asyncio.create_task(db_write_worker())
         else:
              print("⚠️ DB unavailable: skipping init_db/refresh_admin_cache/purge", flush=True)
         
@@ -1612,6 +1865,16 @@ def main():
                 interval=1800,   # 30 minutes
                 first=1800
             )
+            app.job_queue.run_repeating(
+                flush_pending_users,
+                interval=USER_FLUSH_INTERVAL,
+                first=USER_FLUSH_INTERVAL
+            )
+            app.job_queue.run_repeating(
+                cleanup_state_caches,
+                interval=600,    # 10 minutes
+                first=600
+            )
             print("🧹 RAM cache cleanup job scheduled", flush=True)
 
         print("🤖 No-Forward Bot running (PRODUCTION READY)", flush=True)
@@ -1623,14 +1886,23 @@ def main():
 
     app.add_error_handler(on_error)
     
+    async def on_shutdown(app):
+        await flush_pending_users()
+        writer = app.bot_data.get("db_writer")
+        if writer is not None:
+            # flush queued writes before the pool goes away
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(DB_WRITE_QUEUE.join(), timeout=10)
+            writer.cancel()
+        # async pool must be closed on the loop that owns it
+        if pool is not None:
+            await pool.close()
+
     # ✅ IMPORTANT
     app.post_init = on_startup
+    app.post_shutdown = on_shutdown
 
-    try:
-        app.run_polling(close_loop=False)
-    finally:
-        if pool:
-            pool.close()
+    app.run_polling(close_loop=False)
 
 
 if __name__ == "__main__":